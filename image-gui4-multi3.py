@@ -1,9 +1,13 @@
-import io
+import concurrent.futures
+import itertools
+import mmap
 import multiprocessing
 import os
 import queue
+import struct
 import threading
 import time
+import traceback
 import tkinter as tk
 from tkinter import filedialog
 
@@ -16,91 +20,358 @@ import piexif
 # --- 1. “工人”函数 ---
 # ==============================================================================
 
-def process_single_file(args):
+THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT = 160, 120
+# libjpeg可以在IDCT阶段直接按这些倍数缩小解码
+REDUCED_DECODE_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                        (2, cv2.IMREAD_REDUCED_COLOR_2))
+EXIF_HEADER = b"Exif\x00\x00"
+# 缩略图编码参数只构造一次, 每个文件复用
+THUMBNAIL_ENCODE_PARAMS = (cv2.IMWRITE_JPEG_QUALITY, 85,
+                           cv2.IMWRITE_JPEG_SAMPLING_FACTOR, cv2.IMWRITE_JPEG_SAMPLING_FACTOR_420)
+
+
+def _find_exif_segment(data):
+    """
+    在JPEG数据中定位EXIF APP1段。
+    返回 (start, end): 已有EXIF段时为该段的范围; 没有时 start == end, 即新EXIF段的插入位置。
+    """
+    if data[0:2] != b"\xff\xd8":
+        raise ValueError("不是有效的JPEG文件")
+
+    # 一直找到SOS为止: EXIF段前面可能还有COM、DQT等其他段
+    pos = insert_at = 2
+    while pos + 4 <= len(data) and data[pos] == 0xFF:
+        marker = data[pos + 1]
+        if marker == 0xFF:  # 段之间的填充字节
+            pos += 1
+            continue
+        if marker in (0xDA, 0xD9):  # SOS之后是图像数据, 不会再有EXIF段
+            break
+        end = pos + 2 + struct.unpack(">H", data[pos + 2:pos + 4])[0]
+        if marker == 0xE1 and data[pos + 4:pos + 10] == EXIF_HEADER:
+            return pos, end
+        if marker == 0xE0 and pos == 2:
+            insert_at = end  # 有JFIF APP0时, EXIF段放在它后面
+        pos = end
+    return insert_at, insert_at
+
+
+def _read_jpeg_size(data):
+    """从SOF段读取JPEG的宽高, 不解码图像。"""
+    pos = 2
+    while pos + 9 <= len(data) and data[pos] == 0xFF:
+        marker = data[pos + 1]
+        if marker == 0xFF:  # 段之间的填充字节
+            pos += 1
+            continue
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", data[pos + 5:pos + 9])
+            return width, height
+        pos += 2 + struct.unpack(">H", data[pos + 2:pos + 4])[0]
+    raise ValueError("找不到SOF段")
+
+
+def _choose_decode_flag(data):
+    """
+    按原图尺寸选择缩小解码的倍数, 让解码结果尽量接近但不明显小于缩略图尺寸。
+    读不到尺寸时按原尺寸解码。
+    """
+    try:
+        width, height = _read_jpeg_size(data)
+    except (ValueError, struct.error):
+        return cv2.IMREAD_COLOR
+    if not width or not height:
+        return cv2.IMREAD_COLOR
+
+    # 解码时会按EXIF方向旋转, 两种朝向都要考虑
+    ratio = max(min(THUMBNAIL_WIDTH / width, THUMBNAIL_HEIGHT / height),
+                min(THUMBNAIL_WIDTH / height, THUMBNAIL_HEIGHT / width))
+    for scale, flag in REDUCED_DECODE_FLAGS:
+        if ratio * scale <= 1.1:
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+def _parse_tiff_header(tiff):
+    """
+    解析EXIF中的TIFF头。
+    返回 (byte_order, next_pointer): struct字节序前缀, 以及IFD0中指向IFD1的next指针所在偏移。
+    """
+    if tiff[0:4] not in (b"II*\x00", b"MM\x00*"):
+        raise ValueError("无效的TIFF头")
+    byte_order = ">" if tiff[0:2] == b"MM" else "<"
+    ifd0_offset = struct.unpack_from(byte_order + "L", tiff, 4)[0]
+    entry_count = struct.unpack_from(byte_order + "H", tiff, ifd0_offset)[0]
+    next_pointer = ifd0_offset + 2 + entry_count * 12
+    struct.unpack_from(byte_order + "L", tiff, next_pointer)
+    return byte_order, next_pointer
+
+
+def _has_thumbnail(data):
+    """
+    判断JPEG是否已内嵌缩略图。
+    只读取APP1段并检查IFD1中的缩略图标签, 不需要加载整个文件。
+    """
+    start, end = _find_exif_segment(data)
+    if start == end:
+        return False
+    tiff = data[start + 10:end]
+    byte_order, next_pointer = _parse_tiff_header(tiff)
+    ifd1_offset = struct.unpack_from(byte_order + "L", tiff, next_pointer)[0]
+    if ifd1_offset == 0:
+        return False
+    entry_count = struct.unpack_from(byte_order + "H", tiff, ifd1_offset)[0]
+    tags = {struct.unpack_from(byte_order + "H", tiff, ifd1_offset + 2 + i * 12)[0] for i in range(entry_count)}
+    return piexif.ImageIFD.JPEGInterchangeFormat in tags and piexif.ImageIFD.JPEGInterchangeFormatLength in tags
+
+
+def _ifd1_template(byte_order):
+    """
+    IFD1的固定部分: 3个标签 (Compression=6, 缩略图偏移, 缩略图长度) 加上为0的next指针。
+    偏移和长度先填0, 生成EXIF段时再写入。
+    """
+    return (struct.pack(byte_order + "H", 3)
+            + struct.pack(byte_order + "HHLHH", piexif.ImageIFD.Compression, 3, 1, 6, 0)
+            + struct.pack(byte_order + "HHLL", piexif.ImageIFD.JPEGInterchangeFormat, 4, 1, 0)
+            + struct.pack(byte_order + "HHLL", piexif.ImageIFD.JPEGInterchangeFormatLength, 4, 1, 0)
+            + struct.pack(byte_order + "L", 0))
+
+
+# EXIF段里除缩略图外都是固定结构, 导入时生成一次模板, 处理每个文件时只需复制并改写几个字段
+IFD1_TEMPLATES = {">": _ifd1_template(">"), "<": _ifd1_template("<")}
+IFD1_THUMBNAIL_OFFSET_POS, IFD1_THUMBNAIL_LENGTH_POS = 22, 34  # 两个LONG值在IFD1中的位置
+APP1_PREFIX = b"\xff\xe1\x00\x00" + EXIF_HEADER  # 段长度在生成时填入
+# 没有EXIF或EXIF已损坏时使用: 大端TIFF头 + 空的IFD0, 其next指针(偏移10)留给IFD1
+MINIMAL_TIFF = b"MM\x00*" + struct.pack(">LHL", 8, 0, 0)
+
+
+def _build_exif_segment(data, start, end, thumbnail):
+    """
+    生成内嵌了缩略图的EXIF APP1段。
+    已有EXIF时保留原TIFF数据, 在末尾追加新的IFD1并改写IFD0的next指针; 否则生成一个最小的EXIF。
+    """
+    tiff = data[start + len(APP1_PREFIX):end]
+    try:
+        byte_order, next_pointer = _parse_tiff_header(tiff)
+    except (ValueError, struct.error):
+        byte_order, next_pointer = ">", 10
+        tiff = MINIMAL_TIFF
+
+    # 直接在最终的段缓冲区上拼接和改写, 偏移都相对于TIFF头
+    tiff_start = len(APP1_PREFIX)
+    segment = bytearray(APP1_PREFIX)
+    segment += tiff
+    if len(tiff) % 2:
+        segment.append(0)  # IFD需要从偶数偏移开始
+    ifd1_offset = len(segment) - tiff_start
+    ifd1_template = IFD1_TEMPLATES[byte_order]
+    segment += ifd1_template
+    segment += thumbnail
+
+    struct.pack_into(byte_order + "L", segment, tiff_start + next_pointer, ifd1_offset)
+    struct.pack_into(byte_order + "L", segment, tiff_start + ifd1_offset + IFD1_THUMBNAIL_OFFSET_POS,
+                     ifd1_offset + len(ifd1_template))
+    struct.pack_into(byte_order + "L", segment, tiff_start + ifd1_offset + IFD1_THUMBNAIL_LENGTH_POS,
+                     len(thumbnail))
+
+    segment_length = len(segment) - 2
+    if segment_length > 0xFFFF:
+        raise ValueError("EXIF数据超过64KB")
+    struct.pack_into(">H", segment, 2, segment_length)
+    return segment
+
+
+# 工人进程是否需要返回成功日志, 由进程池的initializer设置一次, 不必随每个任务重复传递
+_worker_show_log = True
+# 缩放结果的暂存缓冲区, 每个进程分配一次, 之后每个文件都在它上面取视图, 不再每次重新分配
+_thumb_scratch = None
+# 预读后续文件的后台线程池, 每个进程一个
+_prefetch_executor = None
+PREFETCH_DEPTH = 2
+
+
+def init_worker(show_log):
+    """进程池的initializer, 保存本次处理的配置。单进程模式下直接调用一次。"""
+    global _worker_show_log, _thumb_scratch, _prefetch_executor
+    _worker_show_log = show_log
+    _thumb_scratch = np.empty(THUMBNAIL_WIDTH * THUMBNAIL_HEIGHT * 3, np.uint8)
+    _prefetch_executor = concurrent.futures.ThreadPoolExecutor(max_workers=PREFETCH_DEPTH)
+
+
+def _prefetch_file(full_path):
+    """
+    在后台线程里把文件读进系统缓存, 之后映射这个文件时就不用再等磁盘。
+    有posix_fadvise的平台只需提示内核预读; 其他平台 (Windows) 分块读一遍。
+    """
+    try:
+        with open(full_path, 'rb', buffering=0) as f:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+                return
+            buffer = bytearray(1 << 20)
+            while f.readinto(buffer):
+                pass
+    except OSError:
+        pass  # 预读失败不影响处理, 真正读取时会再报告错误
+
+
+def _output_folder_for(current_folder, output_root_folder, root_folder):
+    """输入子文件夹对应的输出文件夹, 保持与输入相同的层级。"""
+    return os.path.join(output_root_folder, os.path.relpath(current_folder, root_folder))
+
+
+def _write_parts(path, parts):
+    """
+    把多个缓冲区依次写入文件。
+    支持os.writev的平台一次系统调用交给内核 (注意处理部分写入); Windows上逐个f.write。
+    """
+    with open(path, 'wb') as f:
+        if not hasattr(os, "writev"):
+            for part in parts:
+                f.write(part)
+            return
+
+        pending = [memoryview(part) for part in parts]
+        while pending:
+            written = os.writev(f.fileno(), pending)
+            while pending and written >= len(pending[0]):
+                written -= len(pending.pop(0))
+            if written:
+                pending[0] = pending[0][written:]
+
+
+def check_single_file(full_path):
+    """
+    扫描阶段的工人函数, 判断文件是否已有缩略图。
+    返回 (full_path, has_thumbnail); 无法判断时视为没有缩略图, 交给处理阶段。
+    """
+    try:
+        # 只会访问到APP1段所在的页, 不会读入整个文件
+        with open(full_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return full_path, _has_thumbnail(mm)
+    except Exception:
+        return full_path, False
+
+
+def process_single_file(task):
     """
-    处理单个文件的核心函数。
+    处理单个文件的核心函数。task为 (输入路径, 输出路径), 输出路径已由主进程处理好文件名冲突。
     返回一个包含处理状态和消息的元组, e.g., ("SUCCESS", "message text")
     """
-    full_path, output_root_folder, filename_format, conflict_resolution, root_folder, _ = args
+    full_path, output_path = task
     filename = os.path.basename(full_path)
 
     try:
+        # 只读映射输入文件, 不把整个文件复制成一个bytes对象
         with open(full_path, 'rb') as f:
-            original_bytes = f.read()
-
-        try:
-            exif_dict = piexif.load(original_bytes)
-        except Exception:
-            exif_dict = {"0th": {}, "Exif": {}, "GPS": {}, "1st": {}, "thumbnail": None}
-
-        img = cv2.imdecode(np.frombuffer(original_bytes, np.uint8), cv2.IMREAD_COLOR)
-        if img is None:
-            return "FAILURE", f"失败 (无法解码): {filename}"
-
-        target_width, target_height = 160, 120
-        original_height, original_width = img.shape[:2]
-        ratio = min(target_width / original_width, target_height / original_height)
-        new_width, new_height = int(original_width * ratio), int(original_height * ratio)
-        thumb = cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_AREA)
-
-        success, thumb_buf = cv2.imencode(".jpg", thumb)
-        if not success:
-            return "FAILURE", f"失败 (编码缩略图失败): {filename}"
-
-        if "0th" not in exif_dict:
-            exif_dict["0th"] = {}
-        if piexif.ImageIFD.Orientation not in exif_dict["0th"]:
-            exif_dict["0th"][piexif.ImageIFD.Orientation] = 0
-
-        exif_dict["thumbnail"] = thumb_buf.tobytes()
-        exif_bytes = piexif.dump(exif_dict)
-
-        output_file_in_memory = io.BytesIO()
-        piexif.insert(exif_bytes, original_bytes, output_file_in_memory)
-        output_bytes = output_file_in_memory.getvalue()
-
-        name, ext = os.path.splitext(filename)
-        new_filename_base = filename_format.replace("{Filename}", name)
-        new_filename = f"{new_filename_base}{ext}"
-
-        current_folder = os.path.dirname(full_path)
-        relative_path = os.path.relpath(current_folder, root_folder)
-        output_folder_for_this_file = os.path.join(output_root_folder, relative_path)
-        os.makedirs(output_folder_for_this_file, exist_ok=True)
-        output_path = os.path.join(output_folder_for_this_file, new_filename)
-
-        if os.path.exists(output_path):
-            if conflict_resolution == "skip":
-                return "SKIPPED_EXISTS", f"已跳过 (文件已存在): {new_filename}"
-            elif conflict_resolution == "rename":
-                name_part, ext_part = os.path.splitext(output_path)
-                counter = 2
-                while True:
-                    new_output_path = f"{name_part} ({counter}){ext_part}"
-                    if not os.path.exists(new_output_path):
-                        output_path = new_output_path
-                        break
-                    counter += 1
-
-        with open(output_path, 'wb') as f:
-            f.write(output_bytes)
-
+            original_bytes = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # 无论从哪条路径返回或抛出异常, 离开with时都会关闭映射
+        with original_bytes:
+            if hasattr(original_bytes, "madvise"):  # Windows上没有madvise
+                original_bytes.madvise(mmap.MADV_SEQUENTIAL)
+
+            # 缩略图只有160x120, 让libjpeg在IDCT阶段直接缩小解码, 避免解码全分辨率图像
+            img = cv2.imdecode(np.frombuffer(original_bytes, np.uint8), _choose_decode_flag(original_bytes))
+            if img is None:
+                return "FAILURE", f"失败 (无法解码): {filename}"
+
+            original_height, original_width = img.shape[:2]
+            ratio = min(THUMBNAIL_WIDTH / original_width, THUMBNAIL_HEIGHT / original_height)
+            if 0.9 <= ratio <= 1.1:
+                # 缩小解码的结果已经接近缩略图尺寸, 不用再缩放
+                thumb = img
+            else:
+                new_width, new_height = int(original_width * ratio), int(original_height * ratio)
+                # 缩放比例不大时双线性插值就足够, 只有大幅缩小才需要INTER_AREA
+                interpolation = cv2.INTER_AREA if ratio < 0.5 else cv2.INTER_LINEAR
+                # 缩放结果不超过160x120, 直接写进本进程的暂存缓冲区
+                thumb = _thumb_scratch[:new_height * new_width * 3].reshape(new_height, new_width, 3)
+                cv2.resize(img, (new_width, new_height), dst=thumb, interpolation=interpolation)
+
+            success, thumb_buf = cv2.imencode(".jpg", thumb, THUMBNAIL_ENCODE_PARAMS)
+            if not success:
+                return "FAILURE", f"失败 (编码缩略图失败): {filename}"
+
+            # 只替换/插入EXIF段, 图像数据原样保留
+            exif_start, exif_end = _find_exif_segment(original_bytes)
+            # 直接使用编码结果的缓冲区, 不再tobytes()复制一份
+            exif_segment = _build_exif_segment(original_bytes, exif_start, exif_end, memoryview(thumb_buf).cast("B"))
+
+            # 先写临时文件再原子替换: 中途出错不会留下写了一半的输出文件,
+            # 输出路径就是输入文件本身时也不会截断还在读取的映射
+            temp_path = f"{output_path}.tmp-{os.getpid()}"
+            try:
+                with memoryview(original_bytes) as original_view:
+                    # 原图数据直接从映射写出, 不在用户态拼接
+                    _write_parts(temp_path, (original_view[:exif_start], exif_segment, original_view[exif_end:]))
+                # 写完立即解除映射; Windows上也无法替换仍被映射的文件
+                original_bytes.close()
+                os.replace(temp_path, output_path)
+            except Exception as e:
+                # traceback里的栈帧还引用着映射的切片, 先清掉, 否则退出with时无法关闭映射
+                traceback.clear_frames(e.__traceback__)
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+                raise
+
+        # 不显示日志时成功消息会被主进程丢掉, 没必要格式化后再经管道传回去
+        if not _worker_show_log:
+            return "SUCCESS", None
         return "SUCCESS", f"已处理: {filename} -> {os.path.basename(output_path)}"
 
     except Exception as e:
         return "FAILURE", f"失败: {filename} ({e})"
 
 
+def iter_batch_results(tasks):
+    """
+    依次处理一批文件并逐个产出结果。
+    处理当前文件的同时, 后台线程预读后面的文件, 让磁盘I/O和解码重叠。
+    """
+    for task in tasks[1:PREFETCH_DEPTH + 1]:
+        _prefetch_executor.submit(_prefetch_file, task[0])
+    for i, task in enumerate(tasks):
+        if 0 < i and i + PREFETCH_DEPTH < len(tasks):  # i == 0 的窗口已由上面的预热提交
+            _prefetch_executor.submit(_prefetch_file, tasks[i + PREFETCH_DEPTH][0])
+        yield process_single_file(task)
+
+
+def process_batch(tasks):
+    """进程池使用的工人函数, 一次处理一批文件, 返回结果列表。"""
+    return list(iter_batch_results(tasks))
+
+
 # ==============================================================================
 # --- 2. “管理者”GUI类 ---
 # ==============================================================================
 
+# 日志消息攒够这么多条再一起放进队列, 减少界面刷新次数
+STATUS_BATCH_SIZE = 64
+
+
+def _pool_context():
+    """
+    进程池使用的启动方式。
+    从带有Tk和后台线程的进程里fork可能死锁, 所以POSIX上用forkserver; Windows上只有spawn。
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def _pool_chunksize(task_count, num_processes):
+    """每个进程大约分到8批任务, 用较大的chunksize摊薄进程间通信的开销。"""
+    return max(1, task_count // (num_processes * 8))
+
+
 class App:
     def __init__(self, root):
         self.root = root
         self.root.title("批量为JPG图片内嵌缩略图工具v1.0（不会对图片转码）")
         self.root.geometry("600x580")
-        self.status_queue = multiprocessing.Manager().Queue()
+        self.status_queue = queue.Queue()
 
         main_frame = tk.Frame(root, padx=10, pady=10)
         main_frame.pack(fill=tk.BOTH, expand=True)
@@ -197,40 +468,97 @@ class App:
         self.status_text.delete(1.0, tk.END)
         self.status_text.config(state="disabled")
 
-        tasks = []
-        skipped_thumb_count = 0
+        # 先只遍历目录收集路径, 检查缩略图的工作交给进程池并行完成
+        candidates = []
         for current_folder, _, filenames in os.walk(input_path):
             for filename in filenames:
                 if filename.lower().endswith(('.jpg', '.jpeg')):
-                    full_path = os.path.join(current_folder, filename)
-                    try:
-                        with open(full_path, 'rb') as f:
-                            exif_dict = piexif.load(f.read())
-                            if exif_dict.get("thumbnail") is None:
-                                tasks.append((full_path, output_path, filename_format, conflict_resolution, input_path,
-                                              show_log))
-                            else:
-                                skipped_thumb_count += 1
-                    except:
-                        tasks.append(
-                            (full_path, output_path, filename_format, conflict_resolution, input_path, show_log))
-
-        self.status_queue.put(
-            f"扫描完成，发现 {len(tasks)} 个文件需要处理，{skipped_thumb_count} 个文件因已有缩略图被跳过。")
-        self.start_button.config(text="正在处理中...")
+                    candidates.append(os.path.join(current_folder, filename))
 
         use_mp = self.use_multiprocessing_var.get()
         num_processes = self.cpu_count_var.get()
 
-        worker_args = (tasks, start_time, skipped_thumb_count)
+        task_args = (output_path, filename_format, conflict_resolution, input_path, show_log)
+        worker_args = (candidates, task_args, start_time)
         if use_mp:
             self.run_multiprocessing(*worker_args, num_processes)
         else:
             self.run_single_process(*worker_args)
 
-    def process_results(self, results_iterator, start_time, skipped_thumb_count):
+    def collect_tasks(self, scan_iterator, task_args):
+        tasks = []
+        skipped_thumb_count = 0
+        for full_path, has_thumbnail in scan_iterator:
+            if has_thumbnail:
+                skipped_thumb_count += 1
+            else:
+                tasks.append(full_path)
+
+        # 每个输出文件夹只在这里创建一次, 工人进程里不再为每个文件调用makedirs
+        output_root_folder, _, _, root_folder, _ = task_args
+        for current_folder in {os.path.dirname(full_path) for full_path in tasks}:
+            output_folder = _output_folder_for(current_folder, output_root_folder, root_folder)
+            try:
+                os.makedirs(output_folder, exist_ok=True)
+            except OSError as e:
+                # 这个文件夹里的文件写出时会各自报告失败
+                self.status_queue.put(f"失败 (无法创建输出文件夹): {output_folder} ({e})")
+
+        self.status_queue.put(
+            f"扫描完成，发现 {len(tasks)} 个文件需要处理，{skipped_thumb_count} 个文件因已有缩略图被跳过。")
+        self.start_button.config(text="正在处理中...")
+        tasks, skipped_exists_results = self.plan_output_paths(tasks, task_args)
+        return tasks, skipped_exists_results, skipped_thumb_count
+
+    def plan_output_paths(self, tasks, task_args):
+        """
+        在分发任务前确定每个文件的最终输出路径。
+        每个输出文件夹只scandir一次, 文件名冲突全部在内存里判断, 工人进程不再检查文件是否存在。
+        返回 (任务列表, 因输出文件已存在而跳过的结果列表)。
+        """
+        output_root_folder, filename_format, conflict_resolution, root_folder, _ = task_args
+        existing_names = {}  # 输出文件夹 -> 已占用的文件名 (normcase后)
+        next_counters = {}  # (输出文件夹, 文件名) -> 重命名时下一个可尝试的序号
+        planned_tasks, skipped_exists_results = [], []
+
+        for full_path in tasks:
+            current_folder, filename = os.path.split(full_path)
+            output_folder = _output_folder_for(current_folder, output_root_folder, root_folder)
+            names = existing_names.get(output_folder)
+            if names is None:
+                try:
+                    with os.scandir(output_folder) as entries:
+                        names = {os.path.normcase(entry.name) for entry in entries}
+                except OSError:
+                    names = set()
+                existing_names[output_folder] = names
+
+            name, ext = os.path.splitext(filename)
+            new_filename_base = filename_format.replace("{Filename}", name)
+            new_filename = f"{new_filename_base}{ext}"
+
+            if os.path.normcase(new_filename) in names:
+                if conflict_resolution == "skip":
+                    skipped_exists_results.append(("SKIPPED_EXISTS", f"已跳过 (文件已存在): {new_filename}"))
+                    continue
+                elif conflict_resolution == "rename":
+                    counter_key = (output_folder, os.path.normcase(new_filename))
+                    counter = next_counters.get(counter_key, 2)
+                    while os.path.normcase(f"{new_filename_base} ({counter}){ext}") in names:
+                        counter += 1
+                    next_counters[counter_key] = counter + 1
+                    new_filename = f"{new_filename_base} ({counter}){ext}"
+
+            # 本次运行中已分配的文件名也算占用, 避免两个任务写到同一个文件
+            names.add(os.path.normcase(new_filename))
+            planned_tasks.append((full_path, os.path.join(output_folder, new_filename)))
+
+        return planned_tasks, skipped_exists_results
+
+    def process_results(self, results_iterator, start_time, skipped_thumb_count, show_log):
+        # show_log必须用开始处理时交给工人的那个值; 处理中途勾选日志时, 工人仍会返回空的成功消息
         processed_count, skipped_exists_count, failed_count = 0, 0, 0
-        show_log = self.show_log_var.get()
+        log_lines = []
 
         for status, message in results_iterator:
             if status == "SUCCESS":
@@ -240,8 +568,14 @@ class App:
             elif status == "FAILURE":
                 failed_count += 1
 
-            if show_log or status == "FAILURE":
-                self.status_queue.put(message)
+            if message is not None and (show_log or status == "FAILURE"):
+                log_lines.append(message)
+                if len(log_lines) >= STATUS_BATCH_SIZE:
+                    self.status_queue.put("\n".join(log_lines))
+                    log_lines.clear()
+
+        if log_lines:
+            self.status_queue.put("\n".join(log_lines))
 
         duration = time.monotonic() - start_time
         summary = (
@@ -255,31 +589,53 @@ class App:
         )
         self.status_queue.put(summary)
 
-    def run_multiprocessing(self, tasks, start_time, skipped_thumb_count, num_processes):
+    def run_multiprocessing(self, candidates, task_args, start_time, num_processes):
+        _, _, _, _, show_log = task_args
         try:
-            with multiprocessing.Pool(processes=num_processes) as pool:
-                results_iterator = pool.imap_unordered(process_single_file, tasks)
-                self.process_results(results_iterator, start_time, skipped_thumb_count)
+            # 扫描和处理共用同一个进程池, 避免重复创建进程
+            with _pool_context().Pool(processes=num_processes, initializer=init_worker, initargs=(show_log,)) as pool:
+                scan_iterator = pool.imap_unordered(check_single_file, candidates,
+                                                    chunksize=_pool_chunksize(len(candidates), num_processes))
+                tasks, skipped_exists_results, skipped_thumb_count = self.collect_tasks(scan_iterator, task_args)
+                # 每个工人按批领取任务, 这样它知道接下来要处理哪些文件, 可以提前预读
+                batch_size = _pool_chunksize(len(tasks), num_processes)
+                batches = [tasks[i:i + batch_size] for i in range(0, len(tasks), batch_size)]
+                batch_iterator = pool.imap_unordered(process_batch, batches)
+                results_iterator = itertools.chain(skipped_exists_results,
+                                                   itertools.chain.from_iterable(batch_iterator))
+                self.process_results(results_iterator, start_time, skipped_thumb_count, show_log)
         except Exception as e:
             self.status_queue.put(f"!!! 多进程错误: {e} !!!")
 
-    def run_single_process(self, tasks, start_time, skipped_thumb_count):
-        results_iterator = (process_single_file(task) for task in tasks)
-        self.process_results(results_iterator, start_time, skipped_thumb_count)
+    def run_single_process(self, candidates, task_args, start_time):
+        _, _, _, _, show_log = task_args
+        init_worker(show_log)
+        scan_iterator = (check_single_file(full_path) for full_path in candidates)
+        tasks, skipped_exists_results, skipped_thumb_count = self.collect_tasks(scan_iterator, task_args)
+        results_iterator = itertools.chain(skipped_exists_results, iter_batch_results(tasks))
+        self.process_results(results_iterator, start_time, skipped_thumb_count, show_log)
 
     def check_queue(self):
-        try:
-            message = self.status_queue.get_nowait()
+        # 一次取出队列里的所有消息, 合并成一次Text插入, 减少界面布局的开销
+        messages = []
+        while True:
+            try:
+                messages.append(self.status_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        if messages:
             self.status_text.config(state="normal")
-            self.status_text.insert(tk.END, message + "\n")
+            self.status_text.insert(tk.END, "\n".join(messages) + "\n")
             self.status_text.see(tk.END)
             self.status_text.config(state="disabled")
 
-            if "所有文件处理完毕" in message or message.startswith("!!!") or message.startswith("错误:"):
+            if any("所有文件处理完毕" in message or message.startswith("!!!") or message.startswith("错误:")
+                   for message in messages):
                 self.start_button.config(state="normal", text="开始处理")
-        except queue.Empty:
-            pass
-        self.root.after(100, self.check_queue)
+
+        # 有消息时说明正在处理, 放慢刷新让界面少做重绘; 空闲时保持100毫秒的响应速度
+        self.root.after(250 if messages else 100, self.check_queue)
 
 
 # ==============================================================================
@@ -0,0 +1,28 @@
+import importlib.util
+import os
+import struct
+
+import cv2
+import numpy as np
+import piexif
+
+_spec = importlib.util.spec_from_file_location(
+    "image_gui", os.path.join(os.path.dirname(__file__), os.pardir, "image-gui4-multi3.py"))
+image_gui = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(image_gui)
+
+
+def _jpeg_with_com_before_exif():
+    thumbnail = cv2.imencode(".jpg", np.zeros((8, 8, 3), np.uint8))[1].tobytes()
+    exif = piexif.dump({"0th": {}, "Exif": {}, "GPS": {}, "1st": {}, "thumbnail": thumbnail})
+    com = b"\xff\xfe" + struct.pack(">H", 2 + 7) + b"comment"
+    app1 = b"\xff\xe1" + struct.pack(">H", 2 + len(exif)) + exif
+    return b"\xff\xd8" + com + app1 + b"\xff\xda\x00\x02image data\xff\xd9"
+
+
+def test_exif_after_com_segment_is_found():
+    data = _jpeg_with_com_before_exif()
+    start = data.index(b"\xff\xe1")
+    assert image_gui._find_exif_segment(data) == (start, start + 2 + struct.unpack(">H", data[start + 2:start + 4])[0])
+    assert image_gui._has_thumbnail(data)
+    assert piexif.load(data)["thumbnail"] is not None